@@ -0,0 +1,25 @@
+# Configuração do gunicorn (ver wsgi.py)
+import os, shutil
+from prometheus_client import multiprocess
+
+bind = '0.0.0.0:5000'
+# gthread: cada pedido corre num thread, por isso um download longo (sendfile,
+# sem GIL) ou um stat lento no NFS só ocupa esse thread e não o worker todo.
+# É o mesmo que um servidor ASGI faria com asyncio.to_thread, mas sem perder o
+# wsgi.file_wrapper. Não usar workers gevent/eventlet: o os.stat e o sendfile
+# bloqueiam o event loop e o pool de stats (PARALLEL_STAT_WORKERS) deixa de
+# correr em paralelo.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+def on_starting(server):
+    # Contadores do prometheus partilhados entre workers (ver /metrics)
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
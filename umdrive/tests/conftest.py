@@ -0,0 +1,32 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+# STORAGE_DIR tem de estar definido antes de importar a aplicação
+os.environ['STORAGE_DIR'] = tempfile.mkdtemp(prefix='umdrive-tests-')
+atexit.register(shutil.rmtree, os.environ['STORAGE_DIR'], ignore_errors=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import umdrive  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def storage():
+    for entry in os.scandir(umdrive.STORAGE_DIR):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
+    umdrive.METADATA_FILE.write_bytes(b'{}')
+    umdrive._META.update(data=None, sig=None, offset=0)
+    umdrive._LIST_CACHE.update(key=None, body=None, etag=None)
+    yield umdrive.STORAGE_DIR
+
+
+@pytest.fixture
+def client():
+    return umdrive.app.test_client()
@@ -0,0 +1,96 @@
+import os
+from email.utils import formatdate
+
+import pytest
+
+import umdrive
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def stored(storage):
+    path = storage / 'dados.bin'
+    path.write_bytes(CONTENT)
+    return path
+
+
+def no_open(*args, **kwargs):
+    raise AssertionError('o ficheiro não devia ser aberto')
+
+
+def test_download(client, stored):
+    rv = client.get('/api/files/dados.bin/download')
+    assert rv.status_code == 200
+    assert rv.data == CONTENT
+    assert rv.content_length == len(CONTENT)
+    assert rv.headers['Accept-Ranges'] == 'bytes'
+    assert rv.headers['Content-Disposition'] == 'attachment; filename=dados.bin'
+    st = os.stat(stored)
+    assert rv.get_etag() == (umdrive.file_etag(st), False)
+
+
+def test_if_none_match_is_304_without_opening(client, stored, monkeypatch):
+    etag = client.get('/api/files/dados.bin/download').headers['ETag']
+    monkeypatch.setattr(umdrive, 'open', no_open, raising=False)
+    rv = client.get('/api/files/dados.bin/download', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+    assert rv.headers['ETag'] == etag
+
+
+def test_if_modified_since_is_304_without_opening(client, stored, monkeypatch):
+    since = formatdate(os.stat(stored).st_mtime + 1, usegmt=True)
+    monkeypatch.setattr(umdrive, 'open', no_open, raising=False)
+    rv = client.get('/api/files/dados.bin/download', headers={'If-Modified-Since': since})
+    assert rv.status_code == 304
+
+
+def test_stale_validators_send_the_file(client, stored):
+    since = formatdate(os.stat(stored).st_mtime - 3600, usegmt=True)
+    rv = client.get('/api/files/dados.bin/download',
+                    headers={'If-None-Match': '"outro"', 'If-Modified-Since': since})
+    assert rv.status_code == 200
+    assert rv.data == CONTENT
+
+
+def test_range(client, stored):
+    rv = client.get('/api/files/dados.bin/download', headers={'Range': 'bytes=10-19'})
+    assert rv.status_code == 206
+    assert rv.headers['Content-Range'] == f'bytes 10-19/{len(CONTENT)}'
+    assert rv.data == CONTENT[10:20]
+
+
+def test_if_range(client, stored):
+    etag = client.get('/api/files/dados.bin/download').headers['ETag']
+    rv = client.get('/api/files/dados.bin/download',
+                    headers={'Range': 'bytes=10-19', 'If-Range': etag})
+    assert rv.status_code == 206
+    assert rv.data == CONTENT[10:20]
+    # If-Range de uma versão antiga: vai o ficheiro inteiro
+    rv = client.get('/api/files/dados.bin/download',
+                    headers={'Range': 'bytes=10-19', 'If-Range': '"versao-antiga"'})
+    assert rv.status_code == 200
+    assert rv.data == CONTENT
+
+
+def test_missing_file(client):
+    rv = client.get('/api/files/nada.bin/download')
+    assert rv.status_code == 404
+    assert rv.get_json() == {'error': 'Não encontrado'}
+
+
+def test_reserved_names(client):
+    for name in ('metadata.json', 'metadata.log'):
+        rv = client.get(f'/api/files/{name}/download')
+        assert rv.status_code == 400
+        assert rv.get_json() == {'error': 'Nome de ficheiro reservado'}
+
+
+def test_x_accel_redirect(client, stored, monkeypatch):
+    monkeypatch.setitem(umdrive.app.config, 'X_ACCEL_REDIRECT', True)
+    monkeypatch.setattr(umdrive, 'open', no_open, raising=False)
+    rv = client.get('/api/files/dados.bin/download')
+    assert rv.status_code == 200
+    assert rv.data == b''
+    assert rv.headers['X-Accel-Redirect'] == '/internal-storage/dados.bin'
@@ -0,0 +1,120 @@
+import io
+import os
+import time
+
+import pytest
+
+import umdrive
+
+_AGE = {"n": 0}
+
+
+def age(storage):
+    # Recua os mtimes para fora da janela "racy", cada vez para um valor diferente,
+    # para que a listagem seguinte possa ir para a cache
+    _AGE["n"] += 1
+    when = time.time() - 3600 + _AGE["n"]
+    for path in (storage, umdrive.METADATA_FILE, umdrive.METADATA_LOG):
+        if path.exists():
+            os.utime(path, (when, when))
+
+
+def upload(client, name, data=b'conteudo'):
+    rv = client.post('/api/files', data={'file': (io.BytesIO(data), name)})
+    assert rv.status_code == 201
+
+
+def listing(client):
+    rv = client.get('/api/files')
+    assert rv.status_code == 200
+    return {f['name']: f['metadata'] for f in rv.get_json()}
+
+
+def no_build(*args, **kwargs):
+    raise AssertionError('a listagem devia vir da cache')
+
+
+def test_listing(client, storage):
+    upload(client, 'b.txt', b'12345')
+    upload(client, 'a.txt')
+    (storage / '.escondido').write_bytes(b'x')
+    (storage / 'pasta').mkdir()
+    rv = client.get('/api/files')
+    files = rv.get_json()
+    assert [f['name'] for f in files] == ['a.txt', 'b.txt']
+    assert files[1]['size'] == 5
+    assert files[1]['download_url'] == '/api/files/b.txt/download'
+
+
+def test_if_none_match_is_304(client, storage):
+    upload(client, 'a.txt')
+    etag = client.get('/api/files').headers['ETag']
+    rv = client.get('/api/files', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+    age(storage)
+    assert client.get('/api/files', headers={'If-None-Match': etag}).status_code == 304
+    # Servida da cache
+    assert client.get('/api/files', headers={'If-None-Match': etag}).status_code == 304
+    upload(client, 'b.txt')
+    assert client.get('/api/files', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_recent_listing_is_not_cached(client):
+    upload(client, 'a.txt')
+    listing(client)
+    assert umdrive._LIST_CACHE["key"] is None
+
+
+def test_cached_listing_follows_changes(client, storage, monkeypatch):
+    upload(client, 'a.txt')
+    upload(client, 'b.txt')
+    # Cria já o journal: a seguir um POST só acrescenta uma linha, sem mexer na diretoria
+    client.post('/api/files/b.txt/metadata', json={})
+    age(storage)
+    assert listing(client) == {'a.txt': {}, 'b.txt': {}}
+    assert umdrive._LIST_CACHE["key"] is not None
+    with monkeypatch.context() as m:
+        m.setattr(umdrive, 'build_listing', no_build)
+        assert listing(client) == {'a.txt': {}, 'b.txt': {}}
+
+    upload(client, 'c.txt')
+    assert listing(client) == {'a.txt': {}, 'b.txt': {}, 'c.txt': {}}
+    age(storage)
+    listing(client)
+
+    client.post('/api/files/a.txt/metadata', json={'tag': 'x'})
+    assert listing(client) == {'a.txt': {'tag': 'x'}, 'b.txt': {}, 'c.txt': {}}
+    age(storage)
+    listing(client)
+
+    assert client.delete('/api/files/b.txt').status_code == 200
+    assert listing(client) == {'a.txt': {'tag': 'x'}, 'c.txt': {}}
+    age(storage)
+    listing(client)
+
+    # Reescrever um ficheiro não muda o mtime da diretoria, mas o os.replace sim
+    upload(client, 'c.txt', b'maior do que antes')
+    files = client.get('/api/files').get_json()
+    assert [f['size'] for f in files if f['name'] == 'c.txt'] == [len(b'maior do que antes')]
+
+
+def test_streamed_listing(client, monkeypatch):
+    monkeypatch.setattr(umdrive, 'LIST_STREAM_THRESHOLD', 2)
+    monkeypatch.setattr(umdrive, 'LIST_STREAM_BATCH', 2)
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        upload(client, name)
+    client.post('/api/files/b.txt/metadata', json={'v': 1})
+    assert listing(client) == {'a.txt': {}, 'b.txt': {'v': 1}, 'c.txt': {}}
+    assert umdrive._LIST_CACHE["key"] is None
+
+
+@pytest.mark.parametrize('workers', [0, 16])
+def test_parallel_stat(client, monkeypatch, workers):
+    if not workers:
+        monkeypatch.setattr(umdrive, '_STAT_POOL', None)
+    monkeypatch.setattr(umdrive, 'PARALLEL_STAT_MIN_ENTRIES', 1)
+    for i in range(5):
+        upload(client, f'f{i}.txt', b'x' * i)
+    files = client.get('/api/files').get_json()
+    assert [(f['name'], f['size']) for f in files] == [(f'f{i}.txt', i) for i in range(5)]
@@ -0,0 +1,154 @@
+import io
+import json
+import multiprocessing
+
+import umdrive
+
+
+def run_in_worker(fn, *args):
+    # Processo à parte, com a sua cópia de _META, como outro worker do gunicorn
+    proc = multiprocessing.get_context('fork').Process(target=fn, args=args)
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 0
+
+
+def upload(client, name, data=b'conteudo'):
+    rv = client.post('/api/files', data={'file': (io.BytesIO(data), name)})
+    assert rv.status_code == 201
+
+
+def journal_lines():
+    return [json.loads(line) for line in umdrive.METADATA_LOG.read_bytes().splitlines()]
+
+
+def reload_metadata():
+    # Esquece a cache em memória: o estado vem só do que está no disco
+    umdrive._META.update(data=None, sig=None, offset=0)
+    return umdrive.load_metadata()
+
+
+def test_partial_line_is_applied_once_complete(client):
+    client.post('/api/files/a.txt/metadata', json={'v': 1})
+    assert umdrive.load_metadata() == {'a.txt': {'v': 1}}
+    line = json.dumps({'name': 'a.txt', 'metadata': {'v': 2}}).encode() + b'\n'
+    with open(umdrive.METADATA_LOG, 'ab') as fh:
+        fh.write(line[:10])
+    assert umdrive.load_metadata() == {'a.txt': {'v': 1}}
+    with open(umdrive.METADATA_LOG, 'ab') as fh:
+        fh.write(line[10:])
+    assert umdrive.load_metadata() == {'a.txt': {'v': 2}}
+    assert reload_metadata() == {'a.txt': {'v': 2}}
+
+
+def test_replay_after_truncation(client):
+    client.post('/api/files/a.txt/metadata', json={'v': 1})
+    client.post('/api/files/b.txt/metadata', json={'v': 1})
+    assert umdrive.load_metadata() == {'a.txt': {'v': 1}, 'b.txt': {'v': 1}}
+    # Journal esvaziado por fora e reescrito mais curto do que o offset em cache
+    umdrive.METADATA_LOG.write_bytes(b'')
+    umdrive.METADATA_LOG.write_bytes(
+        json.dumps({'name': 'c.txt', 'metadata': {'v': 3}}).encode() + b'\n')
+    assert umdrive.load_metadata() == {'c.txt': {'v': 3}}
+
+
+def test_compaction(client, storage, monkeypatch):
+    monkeypatch.setattr(umdrive, 'METADATA_COMPACT_BYTES', 300)
+    for i in range(20):
+        client.post(f'/api/files/f{i}.txt/metadata', json={'i': i})
+    (storage / 'f0.txt').write_bytes(b'x')
+    assert client.delete('/api/files/f0.txt').status_code == 200
+    client.post('/api/files/f1.txt/metadata', json={'i': 'novo'})
+    expected = {f'f{i}.txt': {'i': i} for i in range(1, 20)}
+    expected['f1.txt'] = {'i': 'novo'}
+    assert umdrive.METADATA_LOG.stat().st_size < 300
+    assert umdrive.load_metadata() == expected
+    assert reload_metadata() == expected
+    # As entradas antigas já estão no snapshot; o journal só tem as mais recentes
+    snapshot = json.loads(umdrive.METADATA_FILE.read_bytes())
+    assert snapshot['f10.txt'] == {'i': 10}
+    assert len(journal_lines()) < 20
+
+
+def test_compaction_by_other_worker(client):
+    client.post('/api/files/a.txt/metadata', json={'v': 1})
+    assert umdrive.get_metadata('a.txt') == {'v': 1}
+    run_in_worker(compact_with_entries)
+    assert umdrive.get_metadata('a.txt') == {'v': 'outro'}
+    assert umdrive.get_metadata('b.txt') == {'v': 2}
+
+
+def compact_with_entries():
+    umdrive.METADATA_COMPACT_BYTES = 0
+    umdrive.save_metadata_entries({'a.txt': {'v': 'outro'}})
+    umdrive.METADATA_COMPACT_BYTES = 256 * 1024
+    umdrive.save_metadata_entries({'b.txt': {'v': 2}})
+
+
+def test_upload_writes_no_metadata(client):
+    upload(client, 'novo.txt')
+    assert not umdrive.METADATA_LOG.exists()
+    assert umdrive.get_metadata('novo.txt') is None
+    assert client.get('/api/files/novo.txt/metadata').get_json() == {}
+    listing = client.get('/api/files').get_json()
+    assert [(f['name'], f['metadata']) for f in listing] == [('novo.txt', {})]
+
+
+def test_delete_removes_metadata(client):
+    upload(client, 'novo.txt')
+    client.post('/api/files/novo.txt/metadata', json={'tag': 'x'})
+    assert client.delete('/api/files/novo.txt').status_code == 200
+    assert umdrive.get_metadata('novo.txt') is None
+    assert reload_metadata() == {}
+    upload(client, 'novo.txt')
+    assert client.get('/api/files/novo.txt/metadata').get_json() == {}
+
+
+def test_metadata_post_is_written_immediately(client):
+    client.post('/api/files/a.txt/metadata', json={'v': 1})
+    assert journal_lines() == [{'name': 'a.txt', 'metadata': {'v': 1}}]
+
+
+def test_interleaved_writers_same_name(client):
+    client.post('/api/files/a.txt/metadata', json={'a': 1})
+    run_in_worker(post_metadata, 'a.txt', {'a': 2})
+    assert client.get('/api/files/a.txt/metadata').get_json() == {'a': 2}
+    client.post('/api/files/a.txt/metadata', json={'a': 3})
+    run_in_worker(check_metadata, 'a.txt', {'a': 3})
+    run_in_worker(post_metadata, 'a.txt', {'a': 4})
+    assert client.get('/api/files/a.txt/metadata').get_json() == {'a': 4}
+    assert reload_metadata() == {'a.txt': {'a': 4}}
+
+
+def test_delete_in_other_worker(client):
+    upload(client, 'a.txt')
+    client.post('/api/files/a.txt/metadata', json={'a': 1})
+    run_in_worker(delete_file, 'a.txt')
+    assert client.get('/api/files/a.txt/metadata').get_json() == {}
+    assert reload_metadata() == {}
+
+
+def post_metadata(name, value):
+    rv = umdrive.app.test_client().post(f'/api/files/{name}/metadata', json=value)
+    assert rv.status_code == 200
+
+
+def check_metadata(name, value):
+    assert umdrive.app.test_client().get(f'/api/files/{name}/metadata').get_json() == value
+
+
+def delete_file(name):
+    assert umdrive.app.test_client().delete(f'/api/files/{name}').status_code == 200
+
+
+def test_big_integers_round_trip(client, monkeypatch):
+    body = b'{"grande": 123456789012345678901234567890, "negativo": -98765432109876543210}'
+    client.post('/api/files/a.txt/metadata', data=body, content_type='application/json')
+    expected = {'grande': 123456789012345678901234567890, 'negativo': -98765432109876543210}
+    assert client.get('/api/files/a.txt/metadata').get_json() == expected
+    assert reload_metadata() == {'a.txt': expected}
+    # Passa também pelo snapshot (compactação)
+    monkeypatch.setattr(umdrive, 'METADATA_COMPACT_BYTES', 0)
+    client.post('/api/files/b.txt/metadata', json={})
+    assert json.loads(umdrive.METADATA_FILE.read_bytes())['a.txt'] == expected
+    assert reload_metadata() == {'a.txt': expected, 'b.txt': {}}
@@ -0,0 +1,113 @@
+import io
+
+import umdrive
+
+
+def create(client, filename='grande.bin', chunks=2, size=10):
+    rv = client.post('/api/uploads', json={'filename': filename, 'chunks': chunks, 'size': size})
+    assert rv.status_code == 201
+    return rv.get_json()['upload_id']
+
+
+def put_chunked(client, url, data):
+    # Sem Content-Length, como um pedido com Transfer-Encoding: chunked
+    return client.put(url, input_stream=io.BytesIO(data),
+                      environ_overrides={'wsgi.input_terminated': True})
+
+
+def test_upload_empty_sanitised_name(client, storage):
+    for name in ('日本', '...'):
+        rv = client.post('/api/files', data={'file': (io.BytesIO(b'x' * 1000), name)})
+        assert rv.status_code == 400
+        assert rv.get_json() == {'error': 'Nome de ficheiro vazio'}
+    assert list(storage.iterdir()) == [umdrive.METADATA_FILE]
+
+
+def test_upload_reserved_name(client):
+    rv = client.post('/api/files', data={'file': (io.BytesIO(b'{}'), 'metadata.json')})
+    assert rv.status_code == 400
+
+
+def test_chunked_upload(client, storage):
+    upload_id = create(client, chunks=3, size=11)
+    # Partes por qualquer ordem; reenviar uma parte substitui-a
+    assert client.put(f'/api/uploads/{upload_id}/2', data=b'CCC').status_code == 200
+    assert client.put(f'/api/uploads/{upload_id}/0', data=b'xxxx').status_code == 200
+    assert client.put(f'/api/uploads/{upload_id}/0', data=b'AAAA').status_code == 200
+    assert client.put(f'/api/uploads/{upload_id}/1', data=b'BBBB').status_code == 200
+    rv = client.post(f'/api/uploads/{upload_id}/complete')
+    assert rv.status_code == 201
+    assert rv.get_json() == {'message': 'uploaded', 'file': 'grande.bin'}
+    assert (storage / 'grande.bin').read_bytes() == b'AAAABBBBCCC'
+    assert not (umdrive.UPLOADS_DIR / upload_id).exists()
+
+
+def test_chunked_upload_missing_parts(client):
+    upload_id = create(client, chunks=3)
+    client.put(f'/api/uploads/{upload_id}/1', data=b'B')
+    rv = client.post(f'/api/uploads/{upload_id}/complete')
+    assert rv.status_code == 409
+    assert rv.get_json()['missing'] == [0, 2]
+
+
+def test_chunked_upload_invalid_requests(client):
+    assert client.post('/api/uploads', json={'filename': '日本', 'chunks': 1, 'size': 1}).status_code == 400
+    assert client.post('/api/uploads', json={'filename': 'a', 'chunks': 0, 'size': 1}).status_code == 400
+    assert client.post('/api/uploads', json={'filename': 'a', 'chunks': 1}).status_code == 400
+    upload_id = create(client, chunks=2)
+    assert client.put(f'/api/uploads/{upload_id}/2', data=b'x').status_code == 400
+    assert client.put(f'/api/uploads/{"0" * 32}/0', data=b'x').status_code == 404
+    assert client.put('/api/uploads/../0', data=b'x').status_code == 404
+
+
+def test_chunked_upload_declared_size_too_large(client):
+    size = umdrive.app.config['MAX_CONTENT_LENGTH'] + 1
+    rv = client.post('/api/uploads', json={'filename': 'a.bin', 'chunks': 2, 'size': size})
+    assert rv.status_code == 413
+    assert rv.get_json() == {'error': 'Ficheiro demasiado grande'}
+
+
+def test_chunk_over_declared_size(client):
+    upload_id = create(client, chunks=2, size=10)
+    assert client.put(f'/api/uploads/{upload_id}/0', data=b'A' * 10).status_code == 200
+    # A soma das partes passaria os 10 bytes declarados
+    assert client.put(f'/api/uploads/{upload_id}/1', data=b'B').status_code == 413
+    # Substituir a própria parte não conta duas vezes
+    assert client.put(f'/api/uploads/{upload_id}/0', data=b'A' * 6).status_code == 200
+    assert client.put(f'/api/uploads/{upload_id}/1', data=b'B' * 4).status_code == 200
+    assert client.put(f'/api/uploads/{upload_id}/1', data=b'B' * 5).status_code == 413
+    parts = sorted(p.name for p in (umdrive.UPLOADS_DIR / upload_id).iterdir())
+    assert parts == ['0', '1', 'upload.json']
+    assert client.post(f'/api/uploads/{upload_id}/complete').status_code == 201
+
+
+def test_chunk_without_content_length_is_capped(client):
+    upload_id = create(client, chunks=2, size=10)
+    assert put_chunked(client, f'/api/uploads/{upload_id}/0', b'A' * 11).status_code == 413
+    assert put_chunked(client, f'/api/uploads/{upload_id}/0', b'A' * 7).status_code == 200
+    assert put_chunked(client, f'/api/uploads/{upload_id}/1', b'B' * 4).status_code == 413
+    assert put_chunked(client, f'/api/uploads/{upload_id}/1', b'B' * 3).status_code == 200
+    parts = sorted(p.name for p in (umdrive.UPLOADS_DIR / upload_id).iterdir())
+    assert parts == ['0', '1', 'upload.json']
+
+
+def test_complete_checks_total_size(client, storage):
+    upload_id = create(client, chunks=2, size=10)
+    client.put(f'/api/uploads/{upload_id}/0', data=b'A' * 5)
+    client.put(f'/api/uploads/{upload_id}/1', data=b'B' * 5)
+    # Parte escrita por fora (ex. dois PUT concorrentes que passaram a verificação)
+    (umdrive.UPLOADS_DIR / upload_id / '1').write_bytes(b'B' * 6)
+    assert client.post(f'/api/uploads/{upload_id}/complete').status_code == 413
+    assert not (umdrive.UPLOADS_DIR / upload_id).exists()
+    assert not (storage / 'grande.bin').exists()
+
+
+def test_abort_upload(client, storage):
+    upload_id = create(client)
+    client.put(f'/api/uploads/{upload_id}/0', data=b'A')
+    rv = client.delete(f'/api/uploads/{upload_id}')
+    assert rv.status_code == 200
+    assert not (umdrive.UPLOADS_DIR / upload_id).exists()
+    assert client.delete(f'/api/uploads/{upload_id}').status_code == 404
+    assert client.post(f'/api/uploads/{upload_id}/complete').status_code == 404
+    assert not (storage / 'grande.bin').exists()
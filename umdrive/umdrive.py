@@ -1,12 +1,63 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template, render_template_string
+from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 from pathlib import Path
 from flask import Response
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, Counter
-import os, json
+from werkzeug.wsgi import wrap_file
+from werkzeug.http import is_resource_modified
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, multiprocess
+from urllib.parse import quote
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+import os, io, re, gzip, json, time, uuid, fcntl, shutil, hashlib, threading, tempfile, mimetypes
+import orjson
+try:
+    import brotli
+except ImportError:  # opcional: sem ele as páginas só vão em gzip
+    brotli = None
+
+# orjson só representa inteiros de 64 bits: números maiores viriam como float
+# (ou dariam erro ao serializar), por isso esses casos vão pelo json da stdlib
+_LONG_NUMBER = re.compile(rb'\d{19}').search
+
+def json_loads(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if _LONG_NUMBER(data):
+        return json.loads(data)
+    return orjson.loads(data)
+
+def json_dumps(obj, option=0, default=None):
+    try:
+        return orjson.dumps(obj, default=default, option=option)
+    except TypeError:
+        return json.dumps(obj, default=default, ensure_ascii=False,
+                          sort_keys=bool(option & orjson.OPT_SORT_KEYS),
+                          indent=2 if option & orjson.OPT_INDENT_2 else None,
+                          separators=None if option & orjson.OPT_INDENT_2 else (',', ':')).encode('utf-8')
+
+class OrjsonProvider(DefaultJSONProvider):
+    # jsonify/get_json via orjson; a resposta é criada diretamente a partir dos bytes
+    def _option(self):
+        return orjson.OPT_SORT_KEYS if self.sort_keys else 0
+
+    def dumps(self, obj, **kwargs):
+        return json_dumps(obj, option=self._option(), default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = json_dumps(obj, option=self._option(), default=self.default)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 http_requests_total = Counter(
     "http_requests_total",
@@ -14,48 +65,292 @@ http_requests_total = Counter(
     ["method", "endpoint"]
 )
 
-# Diretório de armazenamento (NFS montado)
-STORAGE_DIR = Path('/app/storage')
+# Diretório de armazenamento (NFS montado); STORAGE_DIR permite outro caminho (ex. testes)
+STORAGE_DIR = Path(os.environ.get('STORAGE_DIR', '/app/storage'))
 METADATA_FILE = STORAGE_DIR / 'metadata.json'
+# Journal append-only com as alterações feitas desde o último snapshot
+METADATA_LOG = STORAGE_DIR / 'metadata.log'
+RESERVED_NAMES = {METADATA_FILE.name, METADATA_LOG.name}
+# Acima deste tamanho o journal é compactado para metadata.json
+METADATA_COMPACT_BYTES = 256 * 1024
 STORAGE_DIR.mkdir(exist_ok=True)
+_STORAGE_REAL = os.path.realpath(STORAGE_DIR) + os.sep
 if not METADATA_FILE.exists():
-    METADATA_FILE.write_text(json.dumps({}, indent=2), encoding='utf-8')
+    METADATA_FILE.write_bytes(orjson.dumps({}, option=orjson.OPT_INDENT_2))
+
+# Contadores já com labels, um por (método, rota): o endpoint é a regra da rota
+# (ex. /api/files/<filename>/download) e não o caminho, para não criar uma série
+# nova por ficheiro. Preenchido por init_request_counters() depois das rotas.
+_COUNTERS = {}
+
+def init_request_counters():
+    for rule in app.url_map.iter_rules():
+        for method in rule.methods:
+            _COUNTERS[(method, rule.rule)] = http_requests_total.labels(method=method, endpoint=rule.rule)
+    # Pedidos sem rota (404/405)
+    for method in ('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS', 'OTHER'):
+        _COUNTERS[(method, 'unknown')] = http_requests_total.labels(method=method, endpoint='unknown')
 
 @app.before_request
 def before_request():
-    http_requests_total.labels(
-        method=request.method,
-        endpoint=request.path
-    ).inc()
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    counter = _COUNTERS.get((request.method, endpoint)) or _COUNTERS[('OTHER', 'unknown')]
+    counter.inc()
 
 @app.route("/metrics")
 def metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Vários workers (gunicorn): agrega os contadores de todos os processos
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 # Limite de upload (1GB)
 app.config['MAX_CONTENT_LENGTH'] = 1000 * 1024 * 1024
 
+# Ficheiros em static/ (bootstrap, swagger-ui) ficam em cache no browser por um ano:
+# a versão faz parte do caminho (static/vendor/<pacote>-<versão>/)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
+
+# Com USE_X_SENDFILE=1 os downloads são entregues pelo nginx (X-Accel-Redirect)
+app.config['X_ACCEL_REDIRECT'] = os.environ.get('USE_X_SENDFILE') == '1'
+app.config['X_ACCEL_PREFIX'] = os.environ.get('X_ACCEL_PREFIX', '/internal-storage/')
+
 # --- Funções auxiliares ---
-def load_metadata():
+# Cache da metadata em memória: snapshot (metadata.json) + entradas do journal
+# já aplicadas até "offset". Só se relê o que mudou desde o último pedido.
+_META = {"data": None, "sig": None, "offset": 0, "lock": threading.RLock()}
+
+def metadata_signature():
+    try:
+        st = os.stat(METADATA_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def replay_metadata_log(md, offset):
+    """Aplica a md as entradas do journal a partir de offset.
+    Devolve o novo offset, ou None se o journal encolheu (foi compactado)."""
     try:
-        return json.loads(METADATA_FILE.read_text(encoding='utf-8'))
+        with open(METADATA_LOG, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size < offset:
+                return None
+            fh.seek(offset)
+            chunk = fh.read()
+    except FileNotFoundError:
+        return 0 if offset == 0 else None
+    # Ignora uma última linha que ainda esteja a ser escrita
+    end = chunk.rfind(b'\n') + 1
+    for line in chunk[:end].splitlines():
+        try:
+            entry = json_loads(line)
+        except ValueError:
+            continue
+        if entry.get('metadata') is None:
+            md.pop(entry['name'], None)
+        else:
+            md[entry['name']] = entry['metadata']
+    return offset + end
+
+def refresh_metadata():
+    # Chamar sempre com _META["lock"]
+    sig = metadata_signature()
+    if _META["data"] is not None and sig == _META["sig"]:
+        offset = replay_metadata_log(_META["data"], _META["offset"])
+        if offset is not None:
+            _META["offset"] = offset
+            return _META["data"]
+    try:
+        data = json_loads(METADATA_FILE.read_bytes())
     except Exception:
-        return {}
+        data = {}
+    # Re-aplicar entradas já incluídas no snapshot é inofensivo (última escrita ganha)
+    _META.update(data=data, sig=sig, offset=replay_metadata_log(data, 0) or 0)
+    return data
+
+# Ficheiros sem entrada na metadata valem {} (file_info e GET .../metadata), por isso
+# um upload não escreve nada; POST e DELETE vão logo para o journal, pela ordem dos pedidos
+def load_metadata():
+    with _META["lock"]:
+        return dict(refresh_metadata())
+
+def get_metadata(name):
+    with _META["lock"]:
+        return refresh_metadata().get(name)
+
+@contextmanager
+def locked_metadata_log():
+    # flock também serializa as várias instâncias que partilham o NFS
+    fd = os.open(METADATA_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
+
+def write_metadata_snapshot(md, log_fd):
+    # Escrita atómica: ficheiro temporário + os.replace, e só depois esvazia o journal
+    fd, tmp = tempfile.mkstemp(dir=str(STORAGE_DIR), prefix='.metadata-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(json_dumps(md, option=orjson.OPT_INDENT_2))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, METADATA_FILE)
+    except BaseException:
+        unlink_quiet(tmp)
+        raise
+    os.ftruncate(log_fd, 0)
+    _META.update(data=dict(md), sig=metadata_signature(), offset=0)
 
-def save_metadata(md):
-    METADATA_FILE.write_text(json.dumps(md, indent=2), encoding='utf-8')
+def save_metadata_entries(entries):
+    """Grava {nome: metadata} (None apaga) no journal com um único append."""
+    data = b''.join(json_dumps({'name': name, 'metadata': value}) + b'\n'
+                    for name, value in entries.items())
+    with _META["lock"], locked_metadata_log() as fd:
+        os.write(fd, data)
+        if os.fstat(fd).st_size > METADATA_COMPACT_BYTES:
+            write_metadata_snapshot(refresh_metadata(), fd)
 
-def is_within_directory(child: Path, parent: Path) -> bool:
-    return str(child.resolve()).startswith(str(parent.resolve()))
+# Nomes ASCII simples já saem iguais do secure_filename (que remove '.' e '_'
+# nas pontas), por isso podem saltar a normalização unicode e as regex dele
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9-](?:[A-Za-z0-9._-]{0,253}[A-Za-z0-9-])?$').match
 
-def file_info(path: Path):
-    st = path.stat()
+def fast_secure(name):
+    return name if _SAFE_NAME(name) else secure_filename(name)
+
+def unlink_quiet(path):
+    try: os.unlink(path)
+    except OSError: pass
+
+# Buffer para cópias em user-space (1MB em vez dos 16KB do FileStorage.save)
+COPY_BUFFER = 1024 * 1024
+
+def stream_fileno(stream):
+    # Só streams que já têm um ficheiro real por trás servem para o sendfile;
+    # um SpooledTemporaryFile ainda em memória é copiado diretamente (o seu
+    # fileno() forçaria uma escrita extra para disco)
+    if getattr(stream, '_rolled', True) is False:
+        return None
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def kernel_copiers():
+    # copy_file_range primeiro: entre ficheiros do mesmo NFS (>= 4.2) a cópia é
+    # feita no próprio servidor e os dados não passam pela rede
+    if hasattr(os, 'copy_file_range'):
+        yield lambda src, dst, offset: os.copy_file_range(src, dst, 1 << 24, offset)
+    yield lambda src, dst, offset: os.sendfile(dst, src, offset, 1 << 24)
+
+def copy_fd(src_fd, dst_fd, offset=0):
+    """Copia src_fd (a partir de offset) para dst_fd dentro do kernel.
+    Devolve False se nem copy_file_range nem sendfile servirem para estes fds."""
+    for copy in kernel_copiers():
+        try:
+            sent = copy(src_fd, dst_fd, offset)
+        except OSError:
+            continue  # ex. EXDEV entre sistemas de ficheiros diferentes
+        if not sent and offset < os.fstat(src_fd).st_size:
+            continue  # alguns sistemas de ficheiros (procfs, FUSE) devolvem 0 em vez de erro
+        while sent:
+            offset += sent
+            sent = copy(src_fd, dst_fd, offset)
+        return True
+    return False
+
+@contextmanager
+def atomic_target(target: Path):
+    # Escreve num temporário escondido e só no fim faz os.replace,
+    # para que a listagem nunca mostre ficheiros a meio da escrita
+    fd, tmp = tempfile.mkstemp(dir=str(target.parent), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            yield out
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    except BaseException:
+        unlink_quiet(tmp)
+        raise
+
+def save_stream(stream, target: Path):
+    src_fd = stream_fileno(stream)
+    with atomic_target(target) as out:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(out.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if src_fd is None or not copy_fd(src_fd, out.fileno(), stream.tell()):
+            shutil.copyfileobj(stream, out, length=COPY_BUFFER)
+
+def concat_parts(parts, target: Path):
+    with atomic_target(target) as out:
+        for part in parts:
+            with open(part, 'rb') as src:
+                if not copy_fd(src.fileno(), out.fileno()):
+                    shutil.copyfileobj(src, out, length=COPY_BUFFER)
+                    out.flush()
+
+def file_etag(st):
+    # Tamanho + mtime em ns: muda a cada upload sem ter de ler o conteúdo
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+def set_file_validators(rv, st):
+    rv.set_etag(file_etag(st))
+    rv.last_modified = st.st_mtime
+    rv.accept_ranges = 'bytes'
+    rv.cache_control.no_cache = True
+
+def send_storage_file(path: Path):
+    mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    if app.config['X_ACCEL_REDIRECT']:
+        # O proxy lê o ficheiro e envia-o com sendfile; aqui só vão headers
+        rv = Response(mimetype=mimetype)
+        rv.headers['X-Accel-Redirect'] = app.config['X_ACCEL_PREFIX'] + quote(path.name)
+    else:
+        st = os.stat(path)
+        if not is_resource_modified(request.environ, etag=file_etag(st), last_modified=datetime.fromtimestamp(st.st_mtime, timezone.utc)):
+            # Cópia em cache ainda válida: responde 304 sem abrir o ficheiro
+            rv = Response(status=304)
+            set_file_validators(rv, st)
+        else:
+            # wsgi.file_wrapper (sendfile no gunicorn) quando o servidor o oferece
+            fh = open(path, 'rb')
+            st = os.fstat(fh.fileno())
+            rv = Response(wrap_file(request.environ, fh, COPY_BUFFER),
+                          mimetype=mimetype, direct_passthrough=True)
+            rv.content_length = st.st_size
+            set_file_validators(rv, st)
+            # Range / If-Range / If-None-Match tratados pelo werkzeug
+            rv = rv.make_conditional(request.environ, accept_ranges=True, complete_length=st.st_size)
+    rv.headers.set('Content-Disposition', 'attachment', filename=path.name)
+    return rv
+
+def is_within_storage(path: Path) -> bool:
+    # Um só realpath por pedido, comparado com o prefixo calculado no arranque
+    return os.path.realpath(path).startswith(_STORAGE_REAL)
+
+# Cache da resposta de GET /api/files, invalidada pelos mtimes da pasta e da metadata
+_LIST_CACHE = {"key": None, "body": None, "etag": None, "lock": threading.Lock()}
+# Alterações mais recentes do que isto podem ainda não se refletir no mtime
+# (granularidade do sistema de ficheiros), por isso essas listagens não ficam em cache
+LIST_CACHE_RACY_NS = 2 * 10**9
+
+def listing_key():
+    dir_mtime = os.stat(STORAGE_DIR).st_mtime_ns
+    try:
+        st = os.stat(METADATA_LOG)
+        log = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        log = None
+    return (dir_mtime, metadata_signature(), log)
+
+def file_info(name, st, md: dict):
     return {
-        'name': path.name,
+        'name': name,
         'size': st.st_size,
         'mtime': int(st.st_mtime),
-        'download_url': f'/api/files/{path.name}/download',
-        'metadata': load_metadata().get(path.name, {})
+        'download_url': f'/api/files/{name}/download',
+        'metadata': md.get(name, {})
     }
 
 # --- Rotas Flask ---
@@ -65,8 +360,81 @@ def index():
 
 @app.route("/api/files", methods=['GET'])
 def list_files():
-    files = [file_info(p) for p in STORAGE_DIR.iterdir() if p.is_file() and p.name != METADATA_FILE.name]
-    return jsonify(sorted(files, key=lambda x: x['name'].lower()))
+    key = listing_key()
+    with _LIST_CACHE["lock"]:
+        hit = key == _LIST_CACHE["key"]
+        body, etag = _LIST_CACHE["body"], _LIST_CACHE["etag"]
+    if not hit:
+        md = load_metadata()
+        it = os.scandir(STORAGE_DIR)
+        entries = listable_entries(it)
+        head = list(islice(entries, LIST_STREAM_THRESHOLD + 1))
+        if len(head) > LIST_STREAM_THRESHOLD:
+            # Diretoria grande: envia à medida que lê, sem ordenação nem cache
+            rv = Response(stream_listing(it, chain(head, entries), md), mimetype='application/json')
+            # O gerador pode nunca ser iniciado (cliente desliga antes): fecha o scandir na mesma
+            rv.call_on_close(it.close)
+            return rv
+        it.close()
+        body = build_listing(head, md)
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        newest = max(key[0], key[1][1] if key[1] else 0, key[2][1] if key[2] else 0)
+        if time.time_ns() - newest > LIST_CACHE_RACY_NS:
+            with _LIST_CACHE["lock"]:
+                _LIST_CACHE.update(key=key, body=body, etag=etag)
+    rv = Response(body, mimetype='application/json')
+    rv.set_etag(etag)
+    return rv.make_conditional(request)
+
+# Stats em paralelo: no NFS cada stat é uma ida à rede (0 ou 1 desativa)
+PARALLEL_STAT_WORKERS = int(os.environ.get('PARALLEL_STAT_WORKERS', 16))
+_STAT_POOL = (ThreadPoolExecutor(max_workers=PARALLEL_STAT_WORKERS, thread_name_prefix='stat')
+              if PARALLEL_STAT_WORKERS > 1 else None)
+# Abaixo disto não compensa distribuir pelo pool
+PARALLEL_STAT_MIN_ENTRIES = 64
+
+def entry_stat(entry):
+    try:
+        return entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return None  # apagado entre o scandir e o stat
+
+def stat_entries(entries):
+    if _STAT_POOL is None or len(entries) < PARALLEL_STAT_MIN_ENTRIES:
+        return map(entry_stat, entries)
+    return _STAT_POOL.map(entry_stat, entries)
+
+# Acima deste nº de ficheiros a listagem é enviada em streaming
+LIST_STREAM_THRESHOLD = int(os.environ.get('LIST_STREAM_THRESHOLD', 5000))
+LIST_STREAM_BATCH = 256
+
+def listable_entries(it):
+    # scandir: is_file() vem do getdents, sem stat
+    return (e for e in it if e.is_file(follow_symlinks=False)
+            and e.name not in RESERVED_NAMES and not e.name.startswith('.'))
+
+def build_listing(entries, md):
+    files = [(e.name.lower(), file_info(e.name, st, md))
+             for e, st in zip(entries, stat_entries(entries)) if st is not None]
+    files.sort(key=itemgetter(0))
+    return json_dumps([info for _, info in files])
+
+def stream_listing(it, entries, md):
+    # Array JSON escrito por lotes: memória constante, sem ordenação (feita na UI)
+    try:
+        yield b'['
+        sep = b''
+        while True:
+            batch = list(islice(entries, LIST_STREAM_BATCH))
+            if not batch: break
+            chunk = b','.join(json_dumps(file_info(e.name, st, md))
+                              for e, st in zip(batch, stat_entries(batch)) if st is not None)
+            if chunk:
+                yield sep + chunk
+                sep = b','
+        yield b']'
+    finally:
+        it.close()
 
 @app.route("/api/files", methods=['POST'])
 def upload_file():
@@ -75,42 +443,167 @@ def upload_file():
     f = request.files['file']
     if f.filename == '':
         return jsonify({'error': 'Nome de ficheiro vazio'}), 400
-    filename = secure_filename(f.filename)
-    f.save(str(STORAGE_DIR / filename))
-    md = load_metadata(); md.setdefault(filename, {}); save_metadata(md)
+    filename = fast_secure(f.filename)
+    # secure_filename pode deixar o nome vazio (ex. '日本', '...'): o destino seria o próprio STORAGE_DIR
+    if filename == '': return jsonify({'error': 'Nome de ficheiro vazio'}), 400
+    if filename in RESERVED_NAMES: return jsonify({'error': 'Nome de ficheiro reservado'}), 400
+    save_stream(f.stream, STORAGE_DIR / filename)
     return jsonify({'message': 'uploaded', 'file': filename}), 201
 
-@app.route("/api/files/<path:filename>/download", methods=['GET'])
+@app.route("/api/files/<filename>/download", methods=['GET'])
 def download_file(filename):
-    safe_name = secure_filename(filename)
+    safe_name = fast_secure(filename)
+    if safe_name in RESERVED_NAMES: return jsonify({'error': 'Nome de ficheiro reservado'}), 400
     path = STORAGE_DIR / safe_name
-    if not path.exists(): return jsonify({'error': 'Não encontrado'}), 404
-    if not is_within_directory(path, STORAGE_DIR): return jsonify({'error': 'Caminho inválido'}), 400
-    return send_from_directory(str(STORAGE_DIR), safe_name, as_attachment=True)
+    if not is_within_storage(path): return jsonify({'error': 'Caminho inválido'}), 400
+    try:
+        return send_storage_file(path)
+    except FileNotFoundError:
+        return jsonify({'error': 'Não encontrado'}), 404
 
-@app.route("/api/files/<path:filename>", methods=['DELETE'])
+@app.route("/api/files/<filename>", methods=['DELETE'])
 def delete_file(filename):
-    safe_name = secure_filename(filename)
-    path = STORAGE_DIR / safe_name
-    if not path.exists(): return jsonify({'error': 'Não encontrado'}), 404
-    path.unlink(); md = load_metadata(); md.pop(safe_name, None); save_metadata(md)
+    safe_name = fast_secure(filename)
+    if safe_name in RESERVED_NAMES: return jsonify({'error': 'Nome de ficheiro reservado'}), 400
+    try:
+        (STORAGE_DIR / safe_name).unlink()
+    except FileNotFoundError:
+        return jsonify({'error': 'Não encontrado'}), 404
+    save_metadata_entries({safe_name: None})
     return jsonify({'message': 'deleted', 'file': safe_name})
 
-@app.route("/api/files/<path:filename>/metadata", methods=['GET','POST'])
+@app.route("/api/files/<filename>/metadata", methods=['GET','POST'])
 def metadata(filename):
-    safe_name = secure_filename(filename)
-    md = load_metadata()
-    if request.method == 'GET': return jsonify(md.get(safe_name, {}))
+    safe_name = fast_secure(filename)
+    if request.method == 'GET':
+        return jsonify(get_metadata(safe_name) or {})
     data = request.get_json()
     if not isinstance(data, dict): return jsonify({'error': 'Esperado JSON object'}), 400
-    md[safe_name] = data; save_metadata(md)
+    save_metadata_entries({safe_name: data})
     return jsonify({'message': 'metadata updated', 'file': safe_name})
 
+# --- Upload por partes (chunks) ---
+# Estado em disco (partilhado pelas instâncias): storage/.tmp/<upload_id>/
+UPLOADS_DIR = STORAGE_DIR / '.tmp'
+MAX_UPLOAD_CHUNKS = 10000
+# Uploads por partes abandonados há mais do que isto são apagados
+UPLOAD_TTL = 24 * 3600
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$').match
+
+def upload_dir(upload_id):
+    if not _UPLOAD_ID(upload_id): return None
+    d = UPLOADS_DIR / upload_id
+    return d if d.is_dir() else None
+
+def read_upload_manifest(d: Path):
+    return orjson.loads((d / 'upload.json').read_bytes())
+
+def stored_parts_size(d: Path, skip: int):
+    # Bytes já recebidos nas outras partes (a parte skip vai ser substituída)
+    with os.scandir(d) as it:
+        return sum(e.stat().st_size for e in it
+                   if e.name.isdigit() and e.name != str(skip))
+
+def purge_stale_uploads():
+    cutoff = time.time() - UPLOAD_TTL
+    try:
+        with os.scandir(UPLOADS_DIR) as it:
+            stale = [e.path for e in it if e.is_dir() and e.stat().st_mtime < cutoff]
+    except FileNotFoundError:
+        return
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+
+@app.route("/api/uploads", methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): return jsonify({'error': 'Esperado JSON object'}), 400
+    filename = fast_secure(str(data.get('filename', '')))
+    chunks = data.get('chunks')
+    size = data.get('size')
+    if filename == '': return jsonify({'error': 'Nome de ficheiro vazio'}), 400
+    if filename in RESERVED_NAMES: return jsonify({'error': 'Nome de ficheiro reservado'}), 400
+    if type(chunks) is not int or not 1 <= chunks <= MAX_UPLOAD_CHUNKS:
+        return jsonify({'error': 'Número de partes inválido'}), 400
+    if type(size) is not int or size < 0: return jsonify({'error': 'Tamanho inválido'}), 400
+    # O limite de upload vale para o ficheiro inteiro, não só para cada parte
+    if size > app.config['MAX_CONTENT_LENGTH']: raise RequestEntityTooLarge()
+    purge_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    d = UPLOADS_DIR / upload_id
+    d.mkdir(parents=True)
+    (d / 'upload.json').write_bytes(orjson.dumps({'filename': filename, 'chunks': chunks, 'size': size}))
+    return jsonify({'upload_id': upload_id, 'file': filename, 'chunks': chunks, 'size': size}), 201
+
+@app.route("/api/uploads/<upload_id>/<int:index>", methods=['PUT'])
+def upload_chunk(upload_id, index):
+    d = upload_dir(upload_id)
+    if d is None: return jsonify({'error': 'Upload não encontrado'}), 404
+    manifest = read_upload_manifest(d)
+    if index >= manifest['chunks']: return jsonify({'error': 'Parte inválida'}), 400
+    # O total das partes nunca pode passar o tamanho declarado no início
+    remaining = manifest['size'] - stored_parts_size(d, index)
+    if request.content_length is not None and request.content_length > remaining:
+        raise RequestEntityTooLarge()
+    # Sem Content-Length (chunked) o corpo é cortado pelo Werkzeug: +1 porque o 413
+    # só surge ao ler para lá do limite, e uma parte de remaining bytes é válida
+    request.max_content_length = remaining + 1
+    save_stream(request.stream, d / str(index))
+    return jsonify({'message': 'chunk stored', 'upload_id': upload_id, 'chunk': index})
+
+@app.route("/api/uploads/<upload_id>/complete", methods=['POST'])
+def complete_upload(upload_id):
+    d = upload_dir(upload_id)
+    if d is None: return jsonify({'error': 'Upload não encontrado'}), 404
+    manifest = read_upload_manifest(d)
+    parts = [d / str(i) for i in range(manifest['chunks'])]
+    missing = [i for i, p in enumerate(parts) if not p.exists()]
+    if missing: return jsonify({'error': 'Partes em falta', 'missing': missing}), 409
+    if sum(p.stat().st_size for p in parts) > manifest['size']:
+        shutil.rmtree(d, ignore_errors=True)
+        raise RequestEntityTooLarge()
+    filename = manifest['filename']
+    concat_parts(parts, STORAGE_DIR / filename)
+    shutil.rmtree(d, ignore_errors=True)
+    return jsonify({'message': 'uploaded', 'file': filename}), 201
+
+@app.route("/api/uploads/<upload_id>", methods=['DELETE'])
+def abort_upload(upload_id):
+    d = upload_dir(upload_id)
+    if d is None: return jsonify({'error': 'Upload não encontrado'}), 404
+    shutil.rmtree(d, ignore_errors=True)
+    return jsonify({'message': 'aborted', 'upload_id': upload_id})
+
 @app.errorhandler(RequestEntityTooLarge)
 def handle_large(e): return jsonify({'error': 'Ficheiro demasiado grande'}), 413
 
+# Páginas estáticas (sem variáveis): servidas a partir de bytes pré-calculados
+# e já comprimidas no arranque (br se houver o módulo brotli, e gzip)
+def static_page(body: bytes):
+    page = {'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+            'identity': body, 'gzip': gzip.compress(body, 9)}
+    if brotli is not None:
+        page['br'] = brotli.compress(body, quality=11)
+    return page
+
+def send_static_page(page, mimetype):
+    encoding = next((e for e in ('br', 'gzip') if e in page and request.accept_encodings[e]), 'identity')
+    rv = Response(page[encoding], mimetype=mimetype)
+    rv.vary.add('Accept-Encoding')
+    if encoding == 'identity':
+        rv.set_etag(page['etag'])
+    else:
+        # Cada codificação é uma representação diferente, com ETag próprio
+        rv.content_encoding = encoding
+        rv.set_etag(f"{page['etag']}-{encoding}")
+    rv.cache_control.public = True
+    rv.cache_control.max_age = 3600
+    return rv.make_conditional(request)
+
+_UI_PAGE = static_page((Path(app.root_path) / 'templates' / 'ui.html').read_bytes())
+
 @app.route("/ui")
-def ui(): return render_template("ui.html")
+def ui(): return send_static_page(_UI_PAGE, 'text/html')
 
 # =========================
 # 🔹 SWAGGER / OPENAPI SETUP
@@ -161,18 +654,80 @@ OPENAPI = {
         "/api/files/{filename}/metadata": {
             "get": {
                 "summary": "Ler metadata",
-                "parameters": [{"name": "filename", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "parameters": [
+                    {"name": "filename", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
                 "responses": {"200": {"description": "Metadata JSON"}}
             },
             "post": {
                 "summary": "Atualizar metadata",
-                "parameters": [{"name": "filename", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "parameters": [
+                    {"name": "filename", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
                 "requestBody": {
                     "required": True,
                     "content": {"application/json": {"schema": {"type": "object"}}}
                 },
                 "responses": {"200": {"description": "Metadata atualizada"}}
             }
+        },
+        "/api/uploads": {
+            "post": {
+                "summary": "Iniciar upload por partes",
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "type": "object",
+                                "properties": {
+                                    "filename": {"type": "string"},
+                                    "chunks": {"type": "integer"},
+                                    "size": {"type": "integer", "description": "Tamanho total em bytes (máx. 1GB)"}
+                                },
+                                "required": ["filename", "chunks", "size"]
+                            }
+                        }
+                    }
+                },
+                "responses": {
+                    "201": {"description": "Upload criado (devolve upload_id)"},
+                    "400": {"description": "Erro no pedido"},
+                    "413": {"description": "Ficheiro demasiado grande"}
+                }
+            }
+        },
+        "/api/uploads/{upload_id}/{index}": {
+            "put": {
+                "summary": "Enviar uma parte",
+                "parameters": [
+                    {"name": "upload_id", "in": "path", "required": True, "schema": {"type": "string"}},
+                    {"name": "index", "in": "path", "required": True, "schema": {"type": "integer"}}
+                ],
+                "requestBody": {
+                    "required": True,
+                    "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}
+                },
+                "responses": {"200": {"description": "Parte guardada"}, "404": {"description": "Upload não encontrado"}}
+            }
+        },
+        "/api/uploads/{upload_id}/complete": {
+            "post": {
+                "summary": "Concluir upload por partes",
+                "parameters": [{"name": "upload_id", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "responses": {
+                    "201": {"description": "Ficheiro carregado"},
+                    "409": {"description": "Partes em falta"},
+                    "413": {"description": "Partes maiores do que o tamanho declarado"}
+                }
+            }
+        },
+        "/api/uploads/{upload_id}": {
+            "delete": {
+                "summary": "Cancelar upload por partes",
+                "parameters": [{"name": "upload_id", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "responses": {"200": {"description": "Cancelado"}, "404": {"description": "Upload não encontrado"}}
+            }
         }
     }
 }
@@ -183,11 +738,11 @@ SWAGGER_HTML = """
   <head>
     <meta charset="utf-8"/>
     <title>umDrive Swagger UI</title>
-    <link rel="stylesheet" href="https://unpkg.com/swagger-ui-dist@4/swagger-ui.css" />
+    <link rel="stylesheet" href="/static/vendor/swagger-ui-4.15.5/swagger-ui.css" integrity="sha384-MP0Va+yeYiqK2P5nMBDbs8BpIADmPwQkiTZpkcGCa2/r9/zxL4AYWVVpBj6DA5uJ" />
   </head>
   <body>
     <div id="swagger-ui"></div>
-    <script src="https://unpkg.com/swagger-ui-dist@4/swagger-ui-bundle.js"></script>
+    <script src="/static/vendor/swagger-ui-4.15.5/swagger-ui-bundle.js" integrity="sha384-IE3ge2ya/ehe8M553wwPS+ei6rhQuZ9vs4H1NFFYYgoukXImpHZiLAW9D5w/CGTx"></script>
     <script>
       const ui = SwaggerUIBundle({
         url: '/openapi.json',
@@ -200,14 +755,20 @@ SWAGGER_HTML = """
 </html>
 """
 
+_OPENAPI_PAGE = static_page(orjson.dumps(OPENAPI))
+_SWAGGER_PAGE = static_page(SWAGGER_HTML.encode('utf-8'))
+
 @app.route("/openapi.json")
 def openapi_json():
-    return jsonify(OPENAPI)
+    return send_static_page(_OPENAPI_PAGE, 'application/json')
 
 @app.route("/swagger")
 def swagger_ui():
-    return render_template_string(SWAGGER_HTML)
+    return send_static_page(_SWAGGER_PAGE, 'text/html')
+
 
+init_request_counters()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Servidor de desenvolvimento; em produção usar gunicorn (ver wsgi.py)
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
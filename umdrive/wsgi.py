@@ -0,0 +1,5 @@
+# Ponto de entrada WSGI para produção:
+#   gunicorn -c gunicorn.conf.py wsgi:application
+from umdrive import app
+
+application = app